@@ -1,17 +1,30 @@
-import colorama
-import crayons
+import abc
+import atexit
+import codecs
 import enum
+import hashlib
+import heapq
+import itertools
 import logging
 import json
 import os
+import random
 import re
 import requests
+import select
+import signal
+import socket
 import time
 import sys
+import threading
+import urllib.parse
+import weakref
 
-from bs4 import BeautifulSoup
-from sendgrid import SendGridAPIClient
-from sendgrid.helpers.mail import Mail
+
+try:
+    import tomllib
+except ImportError:
+    tomllib = None
 
 
 class Modes(enum.Enum):
@@ -40,13 +53,392 @@ class AHUrl(object):
         self.tail = kwargs.get('tail')
 
 
+class Watch(object):
+    def __init__(self, **kwargs):
+        self.key = kwargs.get('key')
+        self.ah_url = kwargs.get('ah_url')
+        self.config = kwargs.get('config')
+        self.attempt = 0
+        self.consecutive_failures = 0
+        self.next_check_time = kwargs.get('next_check_time', 0)
+        self.is_finished = False
+        self.bytes_saved = 0
+        self.seconds_saved = 0
+
+
+class Page(object):
+    def __init__(self, **kwargs):
+        self.text = kwargs.get('text')
+        self.extracted = kwargs.get('extracted', {})
+        self.is_unchanged = kwargs.get('is_unchanged', False)
+        self.is_truncated = kwargs.get('is_truncated', False)
+        self.bytes_saved = 0
+        self.seconds_saved = 0
+
+
+class Timer(object):
+    # Interruptible waits, wake ends the current or next wait early and cancel ends every wait
+    def __init__(self):
+        self.lock = threading.Lock()
+        self.waiters = []
+        self.is_woken = False
+        self.is_cancelled = False
+
+    def wait(self, seconds):
+        event = threading.Event()
+        if not self.start_wait(event.set):
+            return True
+        event.wait(max(0, seconds))
+        return self.end_wait(event.set)
+
+    async def wait_async(self, seconds):
+        import asyncio
+        loop = asyncio.get_running_loop()
+        event = asyncio.Event()
+
+        def waiter():
+            loop.call_soon_threadsafe(event.set)
+
+        if not self.start_wait(waiter):
+            return True
+        try:
+            await asyncio.wait_for(event.wait(), None if seconds is None else max(0, seconds))
+        except asyncio.TimeoutError:
+            pass
+        return self.end_wait(waiter)
+
+    def start_wait(self, waiter):
+        # False when the wait should end right away
+        with self.lock:
+            if self.is_cancelled or self.is_woken:
+                self.is_woken = False
+                return False
+            self.waiters.append(waiter)
+            return True
+
+    def end_wait(self, waiter):
+        # True when the wait was ended early
+        with self.lock:
+            self.waiters.remove(waiter)
+            is_woken = self.is_woken
+            self.is_woken = False
+            return is_woken or self.is_cancelled
+
+    def wake(self):
+        with self.lock:
+            self.is_woken = True
+            for waiter in self.waiters:
+                waiter()
+
+    def cancel(self):
+        self.is_cancelled = True
+        self.wake()
+
+
+class Hunter(object):
+    # The state of one hunt, several hunters can run side by side in a single process
+    def __init__(self, **kwargs):
+        self.cookies = kwargs.get('cookies', {'sid': 28})
+        self.sleep_time = kwargs.get('sleep_time', 5)
+        self.timer = Timer()
+        self.session = None
+        self.session_lock = threading.Lock()
+        self.page_cache = {}
+        self.shared_fetches = {}
+        self.fetch_counts = {'fetches': 0, 'coalesced': 0, 'handshakes': 0}
+        self.sockets = weakref.WeakSet()
+        self.sales_history = {}
+        self.finished_watches = {}
+        self.notifier_specs = kwargs.get('notifier_specs', DEFAULT_NOTIFIERS)
+        self.suppression_time = kwargs.get('suppression_time', SUPPRESSION_TIME)
+
+    def hunt(self, watches, **kwargs):
+        hunt_watches(self, watches, **kwargs)
+
+    def stop(self):
+        self.timer.cancel()
+
+
+class Notifier(abc.ABC):
+    # Sends a batch of notifications at once, keeping its connection open between batches
+    def __init__(self, **kwargs):
+        self.name = kwargs.get('name')
+        self.settings = kwargs
+        self.connection = None
+
+    def get_address(self):
+        return self.name
+
+    def get_required_files(self):
+        return []
+
+    @abc.abstractmethod
+    def send(self, notifications):
+        # Sends the batch, raising when it could not be delivered so it stays in the outbox
+        pass
+
+    def close(self):
+        self.connection = None
+
+
+class SendGridNotifier(Notifier):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.to = kwargs.get('to')
+
+    def get_address(self):
+        return self.to or get_email_notification_address()
+
+    def get_required_files(self):
+        if self.to:
+            return ['data/send_grid_key.txt']
+        return ['data/send_grid_key.txt', 'data/notification_address.txt']
+
+    def send(self, notifications):
+        # SendGrid is only imported once there is something to send
+        from sendgrid.helpers.mail import Mail, To
+
+        # One personalization per recipient, so every address gets its own copy from a single request
+        key, subject, html_content = get_digest(notifications)
+        mail = Mail(
+            from_email='auction_hunter <notifications@auction_hunter>',
+            to_emails=[To(address) for address in get_notification_recipients(notifications[0]['address'])],
+            subject=subject,
+            html_content=html_content,
+            is_multiple=True)
+
+        # The key travels with the email so a resend after a crash can be recognised downstream
+        payload = mail.get()
+        payload['custom_args'] = {'idempotency_key': key}
+
+        if self.connection is None:
+            self.connection = create_notification_session({'Authorization': 'Bearer %s' % get_send_grid_key()})
+        response = self.connection.post(SEND_GRID_URL, json=payload, timeout=NOTIFIER_TIMEOUT,
+                                        headers={'Idempotency-Key': key})
+        log(response.status_code)
+        log(response.text)
+        log(response.headers)
+        response.raise_for_status()
+
+
+class SmtpNotifier(Notifier):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.host = kwargs.get('host', 'localhost')
+        self.port = kwargs.get('port', 25)
+        self.username = kwargs.get('username')
+        self.password = kwargs.get('password')
+        self.starttls = kwargs.get('starttls', False)
+        self.from_address = kwargs.get('from', 'auction_hunter <notifications@auction_hunter>')
+        self.to = kwargs.get('to')
+
+    def get_address(self):
+        return self.to or get_email_notification_address()
+
+    def get_required_files(self):
+        if self.to:
+            return []
+        return ['data/notification_address.txt']
+
+    def send(self, notifications):
+        from email.message import EmailMessage
+
+        # The key doubles as the message id so a resend after a crash can be recognised downstream
+        key, subject, html_content = get_digest(notifications)
+        message = EmailMessage()
+        message['From'] = self.from_address
+        message['To'] = ', '.join(get_notification_recipients(notifications[0]['address']))
+        message['Subject'] = subject
+        message['Message-ID'] = '<%s@auction_hunter>' % key
+        message.set_content(html_content, subtype='html')
+        self.get_connection().send_message(message)
+
+    def get_connection(self):
+        import smtplib
+
+        # Servers drop idle connections, check it is still open before reusing it
+        if self.connection is not None:
+            try:
+                if self.connection.noop()[0] == 250:
+                    return self.connection
+            except (smtplib.SMTPException, OSError):
+                pass
+            self.close()
+
+        self.connection = smtplib.SMTP(self.host, self.port, timeout=NOTIFIER_TIMEOUT)
+        if self.starttls:
+            self.connection.starttls()
+        if self.username:
+            self.connection.login(self.username, self.password)
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            try:
+                self.connection.quit()
+            except Exception:
+                pass
+        self.connection = None
+
+
+class WebhookNotifier(Notifier):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.url = kwargs.get('url')
+        self.headers = kwargs.get('headers', {})
+        if not self.url:
+            raise HandledException('Webhook notifiers need a url')
+
+    def get_address(self):
+        return self.url
+
+    def send(self, notifications):
+        key = get_digest(notifications)[0]
+        if self.connection is None:
+            self.connection = create_notification_session(self.headers)
+        response = self.connection.post(self.url, timeout=NOTIFIER_TIMEOUT, headers={'Idempotency-Key': key}, json={
+            'key': key,
+            'notifications': [get_notification_payload(notification) for notification in notifications],
+        })
+        response.raise_for_status()
+
+
+class UnixSocketNotifier(Notifier):
+    def __init__(self, **kwargs):
+        super().__init__(**kwargs)
+        self.path = kwargs.get('path')
+        if not self.path:
+            raise HandledException('Unix socket notifiers need a path')
+
+    def get_address(self):
+        return self.path
+
+    def send(self, notifications):
+        # One json line per notification, written in a single call
+        lines = ['%s\n' % json.dumps(get_notification_payload(notification)) for notification in notifications]
+        self.get_connection().sendall(''.join(lines).encode())
+
+    def get_connection(self):
+        # A readable socket with nothing to read has been closed by the listener
+        if self.connection is not None:
+            readable = select.select([self.connection], [], [], 0)[0]
+            if readable and not self.connection.recv(1, socket.MSG_PEEK):
+                self.close()
+
+        if self.connection is None:
+            self.connection = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            self.connection.settimeout(NOTIFIER_TIMEOUT)
+            try:
+                self.connection.connect(self.path)
+            except OSError:
+                self.close()
+                raise
+        return self.connection
+
+    def close(self):
+        if self.connection is not None:
+            self.connection.close()
+        self.connection = None
+
+
 class HandledException(Exception):
     pass
 
 
-ERROR_SLEEP_TIME = 5
+class CircuitOpenException(HandledException):
+    def __init__(self, message, retry_at):
+        super(CircuitOpenException, self).__init__(message)
+        self.retry_at = retry_at
+
+
 MAX_RETRIES = 5
 MAX_LINE_LENGTH = 57
+MAX_CONCURRENT_FETCHES = 24
+MAX_SALES_HISTORY = 1000
+
+# After its first check, each watch is checked every interval seconds, give or take this fraction
+WATCH_JITTER = 0.1
+
+# First checks are spread this many seconds apart on average, about the rate ffxiah allows, but never over an interval
+WATCH_START_SPACING = 1
+
+# Adaptive watches poll so that about ADAPTIVE_SALES_PER_CHECK sales happen between checks
+ADAPTIVE_SALES_PER_CHECK = 1
+ADAPTIVE_SALES_WINDOW = 20
+ADAPTIVE_MIN_INTERVAL = 60
+ADAPTIVE_MAX_INTERVAL = 60 * 60
+
+# Rows are buffered and written to the history database in batches
+HISTORY_DB_PATH = 'data/history.db'
+HISTORY_BATCH_SIZE = 200
+HISTORY_FLUSH_SECONDS = 60
+
+# Connection pool tuning for the shared session
+POOL_CONNECTIONS = 4
+POOL_MAXSIZE = MAX_CONCURRENT_FETCHES
+FETCH_TIMEOUT = 30
+
+# Streamed fetches stop reading once the data a check needs has arrived, but closing a response early
+# also closes its keep-alive connection, so they only stop when at least STREAM_MIN_SAVED_BYTES of a body
+# of known length are left, smaller or unknown remainders are read so the connection goes back to the pool
+STREAM_FETCHES = True
+STREAM_CHUNK_SIZE = 8192
+STREAM_MIN_SAVED_BYTES = 64 * 1024
+
+# Seconds between checks of the watch file for changes
+WATCH_FILE_POLL_TIME = 5
+
+# Checks of the same page within this many seconds share a single fetch
+COALESCE_SECONDS = 5
+
+# Dependencies imported on first use rather than at startup, timed by --benchmark-startup
+LAZY_DEPENDENCIES = ('asyncio', 'sqlite3', 'argparse', 'subprocess', 'bs4', 'lxml.etree', 'sendgrid', 'crayons',
+                     'colorama')
+STARTUP_BENCHMARK_RUNS = 5
+
+# Emails are posted straight to the SendGrid api over one keep-alive connection
+SEND_GRID_URL = 'https://api.sendgrid.com/v3/mail/send'
+NOTIFIER_TIMEOUT = 30
+
+# Notifier types that can be listed under notifiers in a watch file, SendGrid is used when none are
+NOTIFIER_TYPES = {
+    'sendgrid': SendGridNotifier,
+    'smtp': SmtpNotifier,
+    'webhook': WebhookNotifier,
+    'unix_socket': UnixSocketNotifier,
+}
+DEFAULT_NOTIFIERS = [{'type': 'sendgrid'}]
+
+# A notification for the same page, condition and observed value is only sent once within this many seconds
+SUPPRESSIONS_PATH = 'data/suppressions.json'
+SUPPRESSION_TIME = 6 * 60 * 60
+
+# The newest sale each player watch has handled, restored at startup so sales made while stopped are reported
+PLAYER_CHECKPOINTS_PATH = 'data/player_checkpoints.json'
+
+# Notifications are appended to the outbox before sending and marked sent once delivered
+OUTBOX_PATH = 'data/outbox.jsonl'
+OUTBOX_POLL_TIME = 60
+OUTBOX_DRAIN_TIME = 30
+
+# Notifications queued within this many seconds are sent as one digest email per recipient, 0 sends each on its own
+NOTIFICATION_DIGEST_TIME = 10
+
+# Token buckets limiting requests per host, rate is the sustained requests per second
+DEFAULT_RATE_LIMIT = {'rate': 1.0, 'burst': 5}
+RATE_LIMITS = {
+    'www.ffxiah.com': {'rate': 1.0, 'burst': 5},
+}
+
+# Failed checks back off exponentially in seconds, with jitter, up to the max
+BACKOFF_BASE_TIME = 15
+BACKOFF_MAX_TIME = 30 * 60
+
+# After MAX_RETRIES consecutive request failures a host's circuit opens and pauses every
+# request to it, then a single probe is let through once the circuit has been open long enough
+CIRCUIT_OPEN_TIME = 60
+CIRCUIT_MAX_OPEN_TIME = 30 * 60
+CIRCUIT_PROBE_WAIT = 5
 
 PATH_TO_SCRIPT = os.path.dirname(os.path.abspath(__file__))
 AUCTION_HUNTER_DIRECTORY_PATH = PATH_TO_SCRIPT[0:len(PATH_TO_SCRIPT)-6]
@@ -70,18 +462,64 @@ SERVER_NAME_TO_SID = {
     'valefor': '9',
 }
 
+HUNT_MODE_TO_DATA_NAME = {
+    Modes.INVENTORY: 'stock',
+    Modes.PRICE: 'Item.sales',
+    Modes.PLAYER: 'Player.sales',
+}
+
+# Patterns used to pull data straight out of the page text without building a soup
+STOCK_PATTERN = re.compile(r'<span[^>]*\bclass=["\'](?:[^"\']*\s)?stock(?:\s[^"\']*)?["\'][^>]*>([^<]*)</span>')
+TRANSACTIONS_PATTERN = re.compile(r'\b((?:Item|Player)\.sales)\s*=\s*')
+JSON_DECODER = json.JSONDecoder()
+
 HEADERS = {'User-Agent': 'Mozilla/5.0 (Macintosh; Intel Mac OS X 10_10_1) ' +
                          'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/39.0.2171.95 Safari/537.36'}
 
-global_sleep_time = 5
-global_cookies = {'sid': 28}
-global_last_sale = None
+# Hosts and the history database are shared by every hunter in the process
+global_rate_limits = {}
+global_rate_limit_lock = threading.Lock()
+global_circuits = {}
+global_circuit_lock = threading.Lock()
+global_history_db = None
+global_history_lock = threading.Lock()
+global_history_buffer = {'stock': [], 'sales': [], 'flushed_at': time.time()}
+global_credentials = {}
+global_notification_lock = threading.Lock()
+global_notifiers = {}
+global_suppressions = None
+global_player_checkpoints = None
+global_player_checkpoint_lock = threading.Lock()
+global_outbox = {}
+global_outbox_timer = Timer()
+global_outbox_thread = None
 
 
 # This script fetches the supplied ffxiah url, checks the item value, & repeats util
 # the item value matches the users specification.  The user is then notified via email.
 def main():
+    arguments = parse_arguments()
+    if arguments.benchmark_startup:
+        return benchmark_startup()
+
+    import colorama
     colorama.init()
+    hunter = Hunter()
+
+    # Let a service manager stop the script without waiting out the current sleep, the handler can interrupt the
+    # main thread while it holds the timer lock so the stop runs on its own thread
+    signal.signal(signal.SIGTERM, lambda signal_number, frame: threading.Thread(target=hunter.stop).start())
+
+    if arguments.test_notifiers:
+        if not arguments.watch_file:
+            print_and_log('--test-notifiers needs a --watch-file', Colors.RED)
+            sys.exit(1)
+        return test_notifiers(arguments.watch_file)
+
+    # Run without any prompts when given a watch file
+    if arguments.watch_file:
+        return run_daemon(hunter, arguments.watch_file)
+
     print_and_log('\n-----================ auction_hunter ================-----', Colors.GREEN)
     print_and_log('Type ctrl + c at any time to quit (cmd + c for mac).', Colors.YELLOW)
 
@@ -94,12 +532,21 @@ def main():
     # Get the stored notification address or solicit one and store it
     get_email_notification_address()
 
+    # Resend anything a previous run left in the outbox
+    start_notification_dispatcher()
+
     # Get the stored server id or solicit one and store it
-    global global_cookies
-    global_cookies = {'sid': get_server_id()}
+    hunter.cookies = {'sid': get_server_id()}
+
+    # Set the sleep time
+    set_sleep_time(hunter)
 
-    # Set the global_sleep_time
-    set_global_sleep_time()
+    # Hunt several urls at once on a shared schedule
+    print_and_log(line_breakify('Would you like to hunt more than one url at the same time?'))
+    if get_boolean_input():
+        setup_logging('watches')
+        hunt_watches(hunter, get_watches())
+        return
 
     # Get the ffxi url and parse
     ah_url = get_ahurl()
@@ -115,16 +562,13 @@ def main():
 
         # Get the config options from the user
         config = get_config(hunt_mode, ah_url)
-        set_global_sleep_time(config)
-
-        continue_options['should_retry'] = True
-        while continue_options.get('should_retry', False):
+        set_sleep_time(hunter, config)
 
-            # Start checking ffxiah and get any restart options afterwards
-            continue_options = check_ffxiah(ah_url, config)
+        # Start checking ffxiah and get any restart options afterwards
+        continue_options = check_ffxiah(hunter, ah_url, config)
 
 
-def check_ffxiah(ah_url, config):
+def check_ffxiah(hunter, ah_url, config):
     print_and_log('\n-----=============== Checking FFXIAH ===============-----', Colors.GREEN)
     attempt = 0  # A count of attempts for logging
     consecutive_failures = 0  # A count of consecutive failures
@@ -132,52 +576,51 @@ def check_ffxiah(ah_url, config):
     # Log some basic debugging information
     log('base_url: %s' % ah_url.base)
     log('params: %s' % ah_url.params)
-    log('cookies: %s' % global_cookies)
+    log('cookies: %s' % hunter.cookies)
 
     while True:
         # Increment the attempt counter
         attempt += 1
 
         try:
-            # Inventory mode
-            if config['hunt_mode'] == Modes.INVENTORY:
-                result = check_inventory(ah_url, attempt, config)
+            result = check_hunt_mode(hunter, ah_url, attempt, config)
 
-            # Price mode
-            elif config['hunt_mode'] == Modes.PRICE:
-                result = check_price(ah_url, attempt, config)
-
-            # Player mode
-            elif config['hunt_mode'] == Modes.PLAYER:
-                result = check_player(ah_url, attempt, config)
+        except CircuitOpenException as e:
+            # The host is failing, wait for the circuit to let a request through
+            print_and_log(e, Colors.YELLOW)
+            sleep(e.retry_at - time.time(), hunter.timer)
+            if hunter.timer.is_cancelled:
+                return {}
+            continue
 
         except HandledException as e:
             print_and_log(e, Colors.RED)
             consecutive_failures += 1
 
-            if consecutive_failures == MAX_RETRIES:
-                print_and_log('Failed %s consecutive times. Stopping for user input' % MAX_RETRIES, Colors.RED)
+            if consecutive_failures % MAX_RETRIES == 0:
+                print_and_log('Failed %s consecutive times, still retrying' % consecutive_failures, Colors.RED)
                 print_and_log('---------------------------------------------------------', Colors.RED)
-                return get_retry_options()
 
-            else:
-                print_and_log('Re-attempting %s out of %s times after sleeping' % (
-                    consecutive_failures, MAX_RETRIES), Colors.YELLOW)
-                sleep(ERROR_SLEEP_TIME)
-                continue
+            backoff_time = get_backoff_time(consecutive_failures)
+            print_and_log('Re-attempting after %d seconds' % backoff_time, Colors.YELLOW)
+            sleep(backoff_time, hunter.timer)
+            if hunter.timer.is_cancelled:
+                return {}
+            continue
 
         # Handle result
         if result:
             if result == Results.CONTINUE_SEARCHING:
+                log('fetch stats: %s' % get_fetch_stats(hunter))
+
                 # Sleep before attempting to try again
-                sleep(global_sleep_time)
+                sleep(get_watch_interval(hunter, config, ah_url), hunter.timer)
+                if hunter.timer.is_cancelled:
+                    return {}
                 consecutive_failures = 0
                 continue
 
             elif result == Results.COMPLETED:
-                # Reset the global last sale
-                global global_last_sale
-                global_last_sale = None
                 return get_restart_options()
 
         # We have no result, kill the loop
@@ -186,57 +629,78 @@ def check_ffxiah(ah_url, config):
         return {}
 
 
+def check_hunt_mode(hunter, ah_url, attempt, config, page=None):
+    # Fetch the page unless it was already fetched for us
+    if page is None:
+        page = fetch_page(hunter, ah_url, get_watch_data_names(config))
+
+    # Inventory mode
+    if config['hunt_mode'] == Modes.INVENTORY:
+        return check_inventory(hunter, ah_url, attempt, config, page)
+
+    # Price mode
+    elif config['hunt_mode'] == Modes.PRICE:
+        return check_price(hunter, ah_url, attempt, config, page)
+
+    # Player mode
+    elif config['hunt_mode'] == Modes.PLAYER:
+        return check_player(hunter, ah_url, attempt, config, page)
+
+
 #######################################################################################################################
 #                                                      Inventory                                                      #
 #######################################################################################################################
-def check_inventory(ah_url, attempt, config):
-    soup = fetch_page_and_soupify(ah_url)
+def check_inventory(hunter, ah_url, attempt, config, page):
+    # Find the item count, reusing the last count when the page is unchanged
+    total_in_stock = extract_page_data(hunter, page, 'stock')
+    record_stock(hunter, ah_url, total_in_stock)
 
-    # Find the item count element
-    total_in_stock = soup.findAll('span', {'class': 'stock'})
-
-    # Parse the soup found into an integer
-    total_in_stock = parse_integer_from_soup(total_in_stock, 'current stock')
+    # Adaptive watches learn how fast the item sells from its sales, an item with no sales keeps its current interval
+    if config.get('is_adaptive'):
+        try:
+            ingest_transactions(hunter, ah_url, extract_page_data(hunter, page, 'Item.sales'))
+        except HandledException as e:
+            log('Not adapting %s: %s' % (ah_url.tail, e))
 
     # Looking for 0 items
     if config['is_count_down']:
-        return check_inventory_empty(total_in_stock, ah_url, attempt)
+        return check_inventory_empty(hunter, total_in_stock, ah_url, attempt)
 
     # Looking for a range
     if config['is_range']:
-        return check_inventory_range(total_in_stock, ah_url, attempt, config)
+        return check_inventory_range(hunter, total_in_stock, ah_url, attempt, config)
 
     # Looking for at least 1
-    return check_inventory_stocked(total_in_stock, ah_url, attempt)
+    return check_inventory_stocked(hunter, total_in_stock, ah_url, attempt)
 
 
-def check_inventory_empty(total_in_stock, ah_url, attempt):
+def check_inventory_empty(hunter, total_in_stock, ah_url, attempt):
     message = line_breakify('#%s check for %s %s:' % (attempt, 'empty', ah_url.tail),
                             green_words=[attempt, 'empty'])
     print_and_log(message)
 
     # If there are 0 in stock:
     if total_in_stock == 0:
-        return handle_inventory_at_target(total_in_stock, ah_url)
+        return handle_inventory_at_target(hunter, total_in_stock, ah_url, 'empty')
 
     # The item is in stock
     return handle_inventory_target_not_reached(total_in_stock, ah_url)
 
 
-def check_inventory_stocked(total_in_stock, ah_url, attempt):
+def check_inventory_stocked(hunter, total_in_stock, ah_url, attempt):
     message = line_breakify('#%s check for %s %s:' % (attempt, 'stocked', ah_url.tail),
                             green_words=[attempt, 'stocked'])
     print_and_log(message)
 
     # If there are 0 in stock:
     if total_in_stock != 0:
-        return handle_inventory_at_target(total_in_stock, ah_url)
+        return handle_inventory_at_target(hunter, total_in_stock, ah_url, 'stocked')
 
     # The item is in stock
     return handle_inventory_target_not_reached(total_in_stock, ah_url)
 
 
-def check_inventory_range(total_in_stock, ah_url, attempt, config):
+def check_inventory_range(hunter, total_in_stock, ah_url, attempt, config):
     lower_bound = config['lower_bound']
     upper_bound = config['upper_bound']
     message = line_breakify('#%s check for %s within %s (%s - %s):' % (
@@ -246,18 +710,24 @@ def check_inventory_range(total_in_stock, ah_url, attempt, config):
 
     # Within range
     if is_within_range(total_in_stock, lower_bound, upper_bound):
-        return handle_inventory_at_target(total_in_stock, ah_url,
-                                          suffix='(range %s - %s)' % (lower_bound, upper_bound))
+        bounds = '%s - %s' % (lower_bound, upper_bound)
+        return handle_inventory_at_target(hunter, total_in_stock, ah_url, 'range %s' % bounds,
+                                          suffix='(range %s)' % bounds)
 
     # Out of range
     return handle_inventory_target_not_reached(total_in_stock, ah_url)
 
 
-def handle_inventory_at_target(total_in_stock, ah_url, suffix=''):
+def handle_inventory_at_target(hunter, total_in_stock, ah_url, condition, suffix=''):
     item_name = ah_url.tail
     print_and_log('Found %s %s! %s' % (total_in_stock, item_name, suffix), color=Colors.GREEN, indent=True)
-    send_email(ah_url, 'There %s %s %s up for sale' % (get_is_or_are(total_in_stock),
-                                                       total_in_stock, item_name))
+    is_sent = send_email(hunter, ah_url, 'There %s %s %s up for sale' % (get_is_or_are(total_in_stock),
+                                                                         total_in_stock, item_name),
+                         condition='inventory %s' % condition, observed_value=total_in_stock)
+
+    # A repeat keeps the watch going so a later change is still reported
+    if not is_sent:
+        return Results.CONTINUE_SEARCHING
     return Results.COMPLETED
 
 
@@ -301,24 +771,23 @@ def get_inventory_config(item_name):
 #######################################################################################################################
 
 
-def check_price(ah_url, attempt, config):
-    soup = fetch_page_and_soupify(ah_url)
-
-    # Get the script tags on the page
-    scripts = soup.findAll('script')
+def check_price(hunter, ah_url, attempt, config, page):
+    # Get the item sales on the page and keep all of them
+    transactions = extract_page_data(hunter, page, 'Item.sales')
+    ingest_transactions(hunter, ah_url, transactions)
 
-    # Parse the soup found into an integer
-    last_sale_price = parse_last_sale_price_from_scripts(scripts)
+    # Parse the last sale into an integer
+    last_sale_price = parse_last_sale_price(transactions)
 
     # Check greater than
     if config['is_greater']:
-        return check_price_greater(last_sale_price, ah_url, attempt, config['target_price'])
+        return check_price_greater(hunter, last_sale_price, ah_url, attempt, config['target_price'])
 
     # Check less than
-    return check_price_less(last_sale_price, ah_url, attempt, config['target_price'])
+    return check_price_less(hunter, last_sale_price, ah_url, attempt, config['target_price'])
 
 
-def check_price_greater(last_sale_price, ah_url, attempt, target_price):
+def check_price_greater(hunter, last_sale_price, ah_url, attempt, target_price):
     message = line_breakify('#%s check for %s price at or above %s:' % (
                             attempt, ah_url.tail, target_price),
                             green_words=[attempt, target_price])
@@ -326,13 +795,13 @@ def check_price_greater(last_sale_price, ah_url, attempt, target_price):
 
     # Greater or equal to
     if last_sale_price >= target_price:
-        return handle_price_at_target(last_sale_price, ah_url)
+        return handle_price_at_target(hunter, last_sale_price, ah_url, 'above %s' % target_price)
 
     # Below target price
     return handle_price_target_not_reached(last_sale_price, ah_url)
 
 
-def check_price_less(last_sale_price, ah_url, attempt, target_price):
+def check_price_less(hunter, last_sale_price, ah_url, attempt, target_price):
     message = line_breakify('#%s check for %s price at or below %s:' % (
                             attempt, ah_url.tail, target_price),
                             green_words=[attempt, target_price])
@@ -340,16 +809,21 @@ def check_price_less(last_sale_price, ah_url, attempt, target_price):
 
     # Less than or equal to
     if last_sale_price <= target_price:
-        return handle_price_at_target(last_sale_price, ah_url)
+        return handle_price_at_target(hunter, last_sale_price, ah_url, 'below %s' % target_price)
 
     # Above target price
     return handle_price_target_not_reached(last_sale_price, ah_url)
 
 
-def handle_price_at_target(last_sale_price, ah_url, suffix=''):
+def handle_price_at_target(hunter, last_sale_price, ah_url, condition, suffix=''):
     item_name = ah_url.tail
     print_and_log('Last %s sale was %s! %s' % (item_name, last_sale_price, suffix), color=Colors.GREEN, indent=True)
-    send_email(ah_url, 'Last %s sale was %s' % (item_name, last_sale_price))
+    is_sent = send_email(hunter, ah_url, 'Last %s sale was %s' % (item_name, last_sale_price),
+                         condition='price %s' % condition, observed_value=last_sale_price)
+
+    # A repeat keeps the watch going so a later change is still reported
+    if not is_sent:
+        return Results.CONTINUE_SEARCHING
     return Results.COMPLETED
 
 
@@ -358,8 +832,8 @@ def handle_price_target_not_reached(last_sale_price, ah_url):
     return Results.CONTINUE_SEARCHING
 
 
-def parse_last_sale_price_from_scripts(scripts):
-    last_sale = parse_transactions(scripts, 'Item.sales')[0]
+def parse_last_sale_price(transactions):
+    last_sale = transactions[0]
     last_sale_price = last_sale.get('price')
 
     if not last_sale_price:
@@ -389,53 +863,63 @@ def get_price_config(item_name):
 #######################################################################################################################
 #                                                       Player                                                        #
 #######################################################################################################################
-def check_player(ah_url, attempt, config):
-    soup = fetch_page_and_soupify(ah_url)
-
-    # Get the script tags on the page
-    scripts = soup.findAll('script')
-
-    # Find the last sale element
-    transaction = parse_latest_player_sale(scripts, ah_url.tail)
+def check_player(hunter, ah_url, attempt, config, page):
+    # Get the player sales on the page and keep all of them
+    transactions = extract_page_data(hunter, page, 'Player.sales')
+    ingest_transactions(hunter, ah_url, transactions)
+
+    # Find the player's own sales, newest first
+    player_sales = parse_player_sales(transactions, ah_url.tail)
+
+    # Pick up where the last run left off, otherwise the newest sale is the starting point, each config tracks its own
+    if config.get('last_saleon') is None:
+        config['last_saleon'] = get_player_checkpoint(hunter, ah_url, config)
+        if config['last_saleon'] is None:
+            config['last_saleon'] = player_sales[0].get('saleon') if player_sales else 0
+            store_player_checkpoint(hunter, ah_url, config, config['last_saleon'])
+    last_saleon = config['last_saleon']
 
     # Check for a specific sale
     if config['specific_item_name']:
-        return check_player_sold_specific_item(transaction, ah_url, attempt, config['specific_item_name'])
+        return check_player_sold_specific_item(hunter, player_sales, last_saleon, ah_url, attempt, config)
 
     # Check for any sale
-    return check_player_any_sale(transaction, ah_url, attempt)
+    return check_player_any_sale(hunter, player_sales, last_saleon, ah_url, attempt, config)
 
 
-def check_player_any_sale(transaction, ah_url, attempt):
+def check_player_any_sale(hunter, player_sales, last_saleon, ah_url, attempt, config):
     message = line_breakify('#%s check for %s sales:' % (attempt, ah_url.tail),
                             green_words=[attempt, ah_url.tail])
     print_and_log(message)
 
-    # New sale
-    if transaction.get('saleon') > global_last_sale.get('saleon'):
-        return handle_player_sale_complete(transaction.get('en_name'), ah_url)
+    # New sales
+    new_sales = [transaction for transaction in player_sales if transaction.get('saleon') > last_saleon]
+    if new_sales:
+        return handle_player_sale_complete(hunter, new_sales, ah_url, config, 'any')
 
     # Nothing sold
     return handle_no_player_sale(ah_url)
 
 
-def check_player_sold_specific_item(transaction, ah_url, attempt, search_item_name):
+def check_player_sold_specific_item(hunter, player_sales, last_saleon, ah_url, attempt, config):
+    search_item_name = config['specific_item_name']
     message = line_breakify('#%s check for %s %s sales:' % (
                             attempt, ah_url.tail, search_item_name),
                             green_words=[attempt, search_item_name])
     print_and_log(message)
 
-    # New sale
-    if transaction.get('saleon') > global_last_sale.get('saleon') and transaction.get('en_name') == search_item_name:
-        return handle_player_sale_complete(transaction.get('en_name'), ah_url)
+    # New sales
+    new_sales = [transaction for transaction in player_sales
+                 if transaction.get('saleon') > last_saleon and transaction.get('en_name') == search_item_name]
+    if new_sales:
+        return handle_player_sale_complete(hunter, new_sales, ah_url, config, 'specific %s' % search_item_name)
 
     # Nothing sold
     return handle_no_player_sale(ah_url)
 
 
-def parse_latest_player_sale(scripts, player_name):
-    transactions = parse_transactions(scripts, 'Player.sales')
-
+def parse_player_sales(transactions, player_name):
+    player_sales = []
     for transaction in transactions:
         item_name = transaction.get('en_name')
         seller_name = transaction.get('seller_name')
@@ -447,23 +931,68 @@ def parse_latest_player_sale(scripts, player_name):
             raise HandledException('Transaction has no seller name')
 
         if seller_name.lower() == player_name.lower():
+            player_sales.append(transaction)
+    return player_sales
 
-            # Set the global last on the first run
-            global global_last_sale
-            if global_last_sale is None:
-                global_last_sale = transaction
 
-            return transaction
-    return None
+def handle_player_sale_complete(hunter, new_sales, ah_url, config, condition):
+    player_name = ah_url.tail
+    if len(new_sales) == 1:
+        message = '%s sold a %s' % (player_name.capitalize(), new_sales[0].get('en_name'))
+    else:
+        message = '%s sold %s items: %s' % (player_name.capitalize(), len(new_sales),
+                                            ', '.join(transaction.get('en_name') for transaction in new_sales))
+    print_and_log(message, color=Colors.GREEN, indent=True)
 
+    # Checkpoint before notifying, the outbox already guarantees the notification itself
+    latest_saleon = new_sales[0].get('saleon')
+    config['last_saleon'] = latest_saleon
+    store_player_checkpoint(hunter, ah_url, config, latest_saleon)
 
-def handle_player_sale_complete(item_name, ah_url):
-    player_name = ah_url.tail
-    print_and_log('%s sold a %s' % (player_name.capitalize(), item_name), color=Colors.GREEN, indent=True)
-    send_email(ah_url, '%s sold a %s' % (player_name.capitalize(), item_name))
+    is_sent = send_email(hunter, ah_url, message, condition='player %s' % condition, observed_value=latest_saleon)
+
+    # A repeat keeps the watch going so a later sale is still reported
+    if not is_sent:
+        return Results.CONTINUE_SEARCHING
     return Results.COMPLETED
 
 
+def get_player_checkpoint(hunter, ah_url, config):
+    with global_player_checkpoint_lock:
+        return get_player_checkpoints().get(get_player_checkpoint_key(hunter, ah_url, config))
+
+
+def store_player_checkpoint(hunter, ah_url, config, saleon):
+    with global_player_checkpoint_lock:
+        player_checkpoints = get_player_checkpoints()
+        player_checkpoints[get_player_checkpoint_key(hunter, ah_url, config)] = saleon
+
+        # The file is replaced whole so a crash never leaves it half written
+        path = get_combined_path(PLAYER_CHECKPOINTS_PATH)
+        temp_path = '%s.tmp' % path
+        with open(temp_path, 'w') as f:
+            json.dump(player_checkpoints, f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temp_path, path)
+
+
+def get_player_checkpoints():
+    global global_player_checkpoints
+    if global_player_checkpoints is None:
+        try:
+            with open(get_combined_path(PLAYER_CHECKPOINTS_PATH), 'r') as f:
+                global_player_checkpoints = json.load(f)
+        except (IOError, ValueError):
+            global_player_checkpoints = {}
+    return global_player_checkpoints
+
+
+def get_player_checkpoint_key(hunter, ah_url, config):
+    # Watches for any sale and for a specific item move at different paces, so each keeps its own mark
+    return '%s|%s|%s' % (hunter.cookies['sid'], get_page_key(ah_url), config['specific_item_name'] or '')
+
+
 def handle_no_player_sale(ah_url):
     print_and_log('%s for %s' % (redify('No new sales'), ah_url.tail), indent=True)
     return Results.CONTINUE_SEARCHING
@@ -488,6 +1017,696 @@ def get_player_config(player_name):
     }
 
 
+#######################################################################################################################
+#                                                       History                                                       #
+#######################################################################################################################
+def ingest_transactions(hunter, ah_url, transactions):
+    history = hunter.sales_history.setdefault(get_page_key(ah_url), {})
+
+    # Every fetch carries the recent history, only sales not seen before are new
+    new_transactions = []
+    for transaction in transactions:
+        saleon = transaction.get('saleon')
+        if saleon is not None and saleon not in history:
+            history[saleon] = transaction
+            new_transactions.append(transaction)
+
+    # Drop the oldest sales once the history is full
+    if len(history) > MAX_SALES_HISTORY:
+        for saleon in sorted(history)[:len(history) - MAX_SALES_HISTORY]:
+            del history[saleon]
+
+    if new_transactions:
+        log('%s new sales recorded for %s' % (len(new_transactions), ah_url.tail))
+        record_sales(hunter, ah_url, new_transactions)
+    return new_transactions
+
+
+def get_sales_history(hunter, ah_url, count=None):
+    # Newest sales first, optionally only the last count sales
+    history = hunter.sales_history.get(get_page_key(ah_url), {})
+    saleons = sorted(history, reverse=True)[:count]
+    return [history[saleon] for saleon in saleons]
+
+
+def get_history_db():
+    global global_history_db
+    with global_history_lock:
+        if global_history_db is None:
+            global_history_db = open_history_db(get_combined_path(HISTORY_DB_PATH))
+            atexit.register(flush_history)
+    return global_history_db
+
+
+def open_history_db(path):
+    import sqlite3
+    db = sqlite3.connect(path, check_same_thread=False)
+    db.row_factory = sqlite3.Row
+    db.execute('PRAGMA journal_mode=WAL')
+    db.execute('PRAGMA synchronous=NORMAL')
+    db.executescript('''
+        CREATE TABLE IF NOT EXISTS stock (
+            page TEXT NOT NULL,
+            page_type TEXT NOT NULL,
+            server INTEGER NOT NULL,
+            observed_at REAL NOT NULL,
+            stock INTEGER NOT NULL
+        );
+        CREATE INDEX IF NOT EXISTS stock_page_server_time ON stock (page, server, observed_at);
+
+        CREATE TABLE IF NOT EXISTS sales (
+            page TEXT NOT NULL,
+            page_type TEXT NOT NULL,
+            server INTEGER NOT NULL,
+            saleon INTEGER NOT NULL,
+            price INTEGER,
+            item_name TEXT,
+            seller_name TEXT,
+            buyer_name TEXT,
+            transaction_json TEXT NOT NULL,
+            PRIMARY KEY (page, server, saleon)
+        );
+        CREATE INDEX IF NOT EXISTS sales_server_time ON sales (server, saleon);
+    ''')
+    return db
+
+
+def record_stock(hunter, ah_url, total_in_stock):
+    row = (get_page_key(ah_url), ah_url.url_type, int(hunter.cookies['sid']), time.time(), total_in_stock)
+    with global_history_lock:
+        global_history_buffer['stock'].append(row)
+    flush_history_if_due()
+
+
+def record_sales(hunter, ah_url, transactions):
+    server = int(hunter.cookies['sid'])
+    rows = []
+    for transaction in transactions:
+        try:
+            price = int(transaction.get('price'))
+        except (TypeError, ValueError):
+            price = None
+        rows.append((get_page_key(ah_url), ah_url.url_type, server, transaction.get('saleon'), price,
+                     transaction.get('en_name'), transaction.get('seller_name'), transaction.get('buyer_name'),
+                     json.dumps(transaction)))
+
+    with global_history_lock:
+        global_history_buffer['sales'].extend(rows)
+    flush_history_if_due()
+
+
+def flush_history_if_due():
+    buffered = len(global_history_buffer['stock']) + len(global_history_buffer['sales'])
+    if buffered >= HISTORY_BATCH_SIZE or time.time() - global_history_buffer['flushed_at'] >= HISTORY_FLUSH_SECONDS:
+        flush_history()
+
+
+def flush_history():
+    import sqlite3
+    db = get_history_db()
+    with global_history_lock:
+        stock_rows = global_history_buffer['stock']
+        sales_rows = global_history_buffer['sales']
+        global_history_buffer['stock'] = []
+        global_history_buffer['sales'] = []
+        global_history_buffer['flushed_at'] = time.time()
+
+        if not stock_rows and not sales_rows:
+            return
+
+        # One transaction per batch, sales already stored by a previous run are ignored
+        try:
+            with db:
+                db.executemany('INSERT INTO stock VALUES (?, ?, ?, ?, ?)', stock_rows)
+                db.executemany('INSERT OR IGNORE INTO sales VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)', sales_rows)
+        except sqlite3.Error as e:
+            print_and_log('Failed to save history: \n%s' % e, Colors.RED)
+            return
+
+    log('Saved %s stock counts and %s sales to history' % (len(stock_rows), len(sales_rows)))
+
+
+def get_stock_history(ah_url, server, start_time=0, end_time=None):
+    return query_history('SELECT * FROM stock WHERE page = ? AND server = ? AND observed_at BETWEEN ? AND ? '
+                         'ORDER BY observed_at', ah_url, server, start_time, end_time)
+
+
+def get_sale_history(ah_url, server, start_time=0, end_time=None):
+    return query_history('SELECT * FROM sales WHERE page = ? AND server = ? AND saleon BETWEEN ? AND ? '
+                         'ORDER BY saleon', ah_url, server, start_time, end_time)
+
+
+def query_history(query, ah_url, server, start_time, end_time):
+    # Range scans over (page, server, time) are served by the indexes
+    if end_time is None:
+        end_time = time.time()
+
+    flush_history()
+    db = get_history_db()
+    with global_history_lock:
+        rows = db.execute(query, (get_page_key(ah_url), int(server), start_time, end_time)).fetchall()
+    return [dict(row) for row in rows]
+
+
+#######################################################################################################################
+#                                                       Watches                                                       #
+#######################################################################################################################
+def hunt_watches(hunter, watches, max_concurrent_fetches=MAX_CONCURRENT_FETCHES, watch_file_path=None):
+    # asyncio and its executor machinery are only needed once there are watches to hunt
+    import asyncio
+    print_and_log('\n-----=============== Checking FFXIAH ===============-----', Colors.GREEN)
+    print_and_log('Hunting %s urls' % len(watches), indent=True)
+
+    # A single event loop is shared by every watch so adding watches
+    # does not add interpreters, parsers, or email clients
+    asyncio.run(hunt_watches_async(hunter, watches, max_concurrent_fetches, watch_file_path))
+
+    if hunter.timer.is_cancelled:
+        print_and_log('\nStopped hunting', Colors.YELLOW)
+    else:
+        print_and_log('\nAll watches have completed', Colors.GREEN)
+
+
+async def hunt_watches_async(hunter, watches, max_concurrent_fetches, watch_file_path=None):
+    import asyncio
+    executor = set_fetch_executor(asyncio.get_running_loop(), max_concurrent_fetches)
+    semaphore = asyncio.Semaphore(max_concurrent_fetches)
+
+    # A min-heap of (next check time, tie breaker, watch), the earliest due watch is always first
+    schedule = []
+    tie_breaker = itertools.count()
+    running = set()
+
+    # Every fetch of a page reads the data any watch on that page needs so checks can share it
+    page_data_names = get_page_data_names(hunter, watches)
+
+    def schedule_watch(watch):
+        heapq.heappush(schedule, (watch.next_check_time, next(tie_breaker), watch))
+
+    def start_watch(watch):
+        # Spread the first checks by the number of watches so they do not fire together, a short list starts right away
+        if not watch.next_check_time:
+            interval = get_watch_interval(hunter, watch.config, watch.ah_url)
+            start_window = min(interval, len(watches) * WATCH_START_SPACING)
+            watch.next_check_time = time.time() + random.uniform(0, start_window)
+        schedule_watch(watch)
+
+    def is_checking(watch):
+        return any(task.watch is watch for task in running)
+
+    def on_watch_checked(task):
+        running.discard(task)
+
+        # Checks are only cancelled when hunting stops, there is nothing to reschedule
+        if task.cancelled():
+            return
+
+        watch = task.watch
+        if task.exception():
+            print_and_log('An error has occured, stopping %s: %s' % (watch.ah_url.tail, task.exception()), Colors.RED)
+            watch.is_finished = True
+
+        # Watches removed by a reload are no longer in watches, the rest completed or failed
+        if watch.is_finished:
+            if watch in watches:
+                watches.remove(watch)
+                hunter.finished_watches[watch.key] = get_watch_signature(watch)
+        else:
+            schedule_watch(watch)
+        hunter.timer.wake()
+
+    for watch in watches:
+        start_watch(watch)
+
+    # Remember the watch file as it is now so only later edits are applied
+    watch_file_stat = None
+    next_poll_time = None
+    if watch_file_path:
+        watch_file_stat = get_watch_file_stat(watch_file_path)
+        next_poll_time = time.time() + WATCH_FILE_POLL_TIME
+
+    try:
+        while (schedule or running or watch_file_path) and not hunter.timer.is_cancelled:
+            # Apply any edits to the watch file without disturbing the unchanged watches
+            if watch_file_path and time.time() >= next_poll_time:
+                next_poll_time = time.time() + WATCH_FILE_POLL_TIME
+                stat = get_watch_file_stat(watch_file_path)
+                if stat != watch_file_stat:
+                    watch_file_stat = stat
+                    for watch in reload_watch_file(hunter, watch_file_path, watches):
+                        start_watch(watch)
+                    page_data_names = get_page_data_names(hunter, watches)
+
+            # Start a check for every watch that is due, removed watches and entries left behind by a reschedule are
+            # dropped here, a watch being checked is scheduled again once its check finishes
+            now = time.time()
+            while schedule and schedule[0][0] <= now:
+                check_time, _, watch = heapq.heappop(schedule)
+                if watch.is_finished or check_time != watch.next_check_time or is_checking(watch):
+                    continue
+                task = asyncio.ensure_future(
+                    check_watch(hunter, watch, semaphore, page_data_names[get_fetch_key(hunter, watch.ah_url)]))
+                task.watch = watch
+                running.add(task)
+                task.add_done_callback(on_watch_checked)
+
+            # Wait until the next watch is due, a check finishes, or something wakes the timer
+            timeout = None
+            if schedule:
+                timeout = schedule[0][0] - time.time()
+            if watch_file_path:
+                timeout = min(timeout or WATCH_FILE_POLL_TIME, next_poll_time - time.time())
+            await hunter.timer.wait_async(timeout)
+    finally:
+        for task in running:
+            task.cancel()
+        executor.shutdown(wait=False)
+
+
+def get_page_data_names(hunter, watches):
+    page_data_names = {}
+    for watch in watches:
+        page_data_names.setdefault(get_fetch_key(hunter, watch.ah_url), set()).update(
+            get_watch_data_names(watch.config))
+    return {fetch_key: tuple(sorted(data_names)) for fetch_key, data_names in page_data_names.items()}
+
+
+async def check_watch(hunter, watch, semaphore, data_names):
+    ah_url = watch.ah_url
+    watch.attempt += 1
+
+    try:
+        page = await fetch_shared_page_async(hunter, ah_url, semaphore, data_names)
+        record_stream_savings(watch, page)
+        result = check_hunt_mode(hunter, ah_url, watch.attempt, watch.config, page)
+
+    except CircuitOpenException as e:
+        # The host is failing, pause until the circuit lets requests through again
+        log('%s: %s' % (ah_url.tail, e))
+        watch.next_check_time = e.retry_at + random.uniform(0, CIRCUIT_PROBE_WAIT)
+        return watch
+
+    except HandledException as e:
+        print_and_log('%s: %s' % (ah_url.tail, e), Colors.RED)
+        watch.consecutive_failures += 1
+
+        backoff_time = get_backoff_time(watch.consecutive_failures)
+        print_and_log('Re-attempting %s after %d seconds (%s consecutive failures)' % (
+            ah_url.tail, backoff_time, watch.consecutive_failures), Colors.YELLOW)
+        watch.next_check_time = time.time() + backoff_time
+        return watch
+
+    if result == Results.CONTINUE_SEARCHING:
+        watch.consecutive_failures = 0
+        watch.next_check_time = get_next_check_time(hunter, watch.config, watch.ah_url)
+        log('fetch stats: %s' % get_fetch_stats(hunter))
+
+    else:
+        # The watch has either completed or has no result
+        if result != Results.COMPLETED:
+            print_and_log('An error has occured, stopping %s' % ah_url.tail, Colors.RED)
+            log(result)
+        watch.is_finished = True
+
+    return watch
+
+
+def record_stream_savings(watch, page):
+    if page.bytes_saved:
+        watch.bytes_saved += page.bytes_saved
+        watch.seconds_saved += page.seconds_saved
+        log('%s streaming has saved %s bytes and %.3f seconds' % (
+            watch.ah_url.tail, watch.bytes_saved, watch.seconds_saved))
+
+
+def get_next_check_time(hunter, config, ah_url=None):
+    interval = get_watch_interval(hunter, config, ah_url)
+    return time.time() + interval * random.uniform(1 - WATCH_JITTER, 1 + WATCH_JITTER)
+
+
+def get_watch_interval(hunter, config, ah_url=None):
+    # Seconds between checks, configs without an interval fall back to the minute based sleep times
+    if config.get('interval'):
+        interval = config['interval']
+    elif config['hunt_mode'] in {Modes.PRICE, Modes.PLAYER}:
+        interval = 15 * 60
+    else:
+        interval = hunter.sleep_time * 60
+
+    if config.get('is_adaptive') and ah_url is not None:
+        interval = get_adaptive_interval(hunter, ah_url, config, interval)
+    return interval
+
+
+def get_adaptive_interval(hunter, ah_url, config, interval):
+    lower_bound = config.get('min_interval', ADAPTIVE_MIN_INTERVAL)
+    upper_bound = config.get('max_interval', ADAPTIVE_MAX_INTERVAL)
+
+    # Estimate the sale rate over the recent sales, including the quiet time since the last one
+    sales = get_sales_history(hunter, ah_url, ADAPTIVE_SALES_WINDOW)
+    if sales:
+        oldest_saleon = sales[-1].get('saleon')
+        elapsed = time.time() - oldest_saleon
+        if elapsed > 0:
+            sales_per_second = len(sales) / elapsed
+            interval = ADAPTIVE_SALES_PER_CHECK / sales_per_second
+            log('%s sells %.2f times an hour, checking every %d seconds' % (
+                ah_url.tail, sales_per_second * 60 * 60, min(max(interval, lower_bound), upper_bound)))
+
+    return min(max(interval, lower_bound), upper_bound)
+
+
+def get_watch_data_names(config):
+    # Adaptive inventory watches also read the item sales to learn how fast the item sells
+    data_names = {HUNT_MODE_TO_DATA_NAME[config['hunt_mode']]}
+    if config.get('is_adaptive') and config['hunt_mode'] == Modes.INVENTORY:
+        data_names.add('Item.sales')
+    return tuple(sorted(data_names))
+
+
+def get_watches():
+    watches = []
+    should_add_watch = True
+    while should_add_watch:
+        ah_url = get_ahurl()
+        hunt_mode = get_hunt_mode(ah_url.url_type)
+        config = get_config(hunt_mode, ah_url)
+
+        print_and_log(line_breakify('Would you like to check more often when %s sells quickly ' % ah_url.tail +
+                                    'and less often when it sells slowly?'))
+        config['is_adaptive'] = get_boolean_input()
+        watches.append(Watch(ah_url=ah_url, config=config))
+
+        print_and_log('\nWould you like to add another url to hunt?')
+        should_add_watch = get_boolean_input()
+    return watches
+
+
+#######################################################################################################################
+#                                                      Watch File                                                     #
+#######################################################################################################################
+def parse_arguments():
+    import argparse
+    parser = argparse.ArgumentParser(description='Hunt the FFXIAH auction house and get notified by email.')
+    parser.add_argument('--watch-file', help='JSON or TOML file of watches to hunt without any prompts')
+    parser.add_argument('--test-notifiers', action='store_true',
+                        help='send a test notification through each notifier in the watch file and exit')
+    parser.add_argument('--benchmark-startup', action='store_true',
+                        help='report the import time of the script with and without its lazy dependencies')
+    return parser.parse_args()
+
+
+def benchmark_startup(runs=STARTUP_BENCHMARK_RUNS):
+    # Compare a cold import of the script with one that also pulls in its lazy dependencies
+    lazy_time = get_import_time(['import auction_hunter'], runs)
+    eager_time = get_import_time(['import auction_hunter'] + ['import %s' % name for name in LAZY_DEPENDENCIES], runs)
+
+    print('Best of %d cold imports:' % runs)
+    print('   lazy dependencies:  %.1f ms' % (lazy_time / 1000))
+    print('   eager dependencies: %.1f ms' % (eager_time / 1000))
+    print('   saved:              %.1f ms' % ((eager_time - lazy_time) / 1000))
+
+
+def get_import_time(statements, runs):
+    import subprocess
+    # Sums the cumulative microseconds of the top level imports reported by python -X importtime
+    script_folder = os.path.dirname(os.path.abspath(__file__))
+    best_time = None
+    for _ in range(runs):
+        process = subprocess.run([sys.executable, '-X', 'importtime', '-c', '; '.join(statements)],
+                                 cwd=script_folder, capture_output=True, text=True, check=True)
+        import_time = 0
+        for line in process.stderr.splitlines():
+            fields = line.split('|')
+            if len(fields) == 3 and fields[1].strip().isdigit() and not fields[2].startswith('  '):
+                import_time += int(fields[1])
+        if best_time is None or import_time < best_time:
+            best_time = import_time
+
+    return best_time
+
+
+def run_daemon(hunter, watch_file_path):
+    create_folder('data')
+    setup_logging('daemon')
+    print_and_log('\n-----================ auction_hunter ================-----', Colors.GREEN)
+
+    try:
+        settings, watches = load_watch_file(watch_file_path)
+        apply_watch_file_settings(hunter, settings)
+
+        check_notifier_files(hunter.notifier_specs)
+
+    except HandledException as e:
+        print_and_log(e, Colors.RED)
+        sys.exit(1)
+
+    print_and_log('Loaded %s watches from %s' % (len(watches), watch_file_path), indent=True)
+    start_notification_dispatcher()
+    hunt_watches(hunter, watches, watch_file_path=watch_file_path)
+
+
+def test_notifiers(watch_file_path):
+    # Sends straight away rather than through the outbox, so each notifier can be tried against a local listener
+    create_folder('data')
+    setup_logging('test_notifiers')
+    try:
+        notifier_specs = load_watch_file(watch_file_path)[0]['notifier_specs']
+        check_notifier_files(notifier_specs)
+    except HandledException as e:
+        print_and_log(e, Colors.RED)
+        sys.exit(1)
+
+    created_at = time.time()
+    failures = 0
+    for notifier_spec in notifier_specs:
+        notifier = get_notifier(notifier_spec)
+        key = hashlib.sha256(('test|%s|%s' % (json.dumps(notifier_spec, sort_keys=True), created_at)).encode())
+        if not deliver_notifications([{
+            'key': key.hexdigest(),
+            'notifier': notifier.name,
+            'notifier_key': get_notifier_key(notifier_spec),
+            'address': notifier.get_address(),
+            'subject': 'auction_hunter test notification',
+            'url': 'https://www.ffxiah.com',
+            'message': 'Test notification from the %s notifier' % notifier.name,
+            'created_at': created_at,
+        }]):
+            failures += 1
+        notifier.close()
+
+    if failures:
+        sys.exit(1)
+
+
+def check_notifier_files(notifier_specs):
+    # Every setting must already be stored, there is no one to answer a prompt
+    for file_path in sorted(set(file_path for notifier_spec in notifier_specs
+                                for file_path in get_notifier(notifier_spec).get_required_files())):
+        if get_file_data(file_path) is None:
+            raise HandledException('%s is missing, run the script once interactively to create it' % file_path)
+
+
+def load_watch_file(watch_file_path):
+    # Nothing is applied here, a file with any invalid part leaves the hunter untouched
+    watch_file = read_watch_file(watch_file_path)
+    if not isinstance(watch_file, dict) or not isinstance(watch_file.get('watches'), list):
+        raise HandledException('%s must contain a list of watches' % watch_file_path)
+
+    # Settings that would otherwise be prompted for
+    settings = {}
+    server_name = watch_file.get('server')
+    if server_name:
+        if server_name.lower() not in SERVER_NAME_TO_SID:
+            raise HandledException('Unknown server %s' % server_name)
+        settings['sid'] = SERVER_NAME_TO_SID[server_name.lower()]
+    else:
+        settings['sid'] = get_file_data('data/server_id.txt')
+        if settings['sid'] is None:
+            raise HandledException('%s must name a server' % watch_file_path)
+
+    try:
+        sleep_time = watch_file.get('sleep_time') or get_file_data('data/sleep_time.txt')
+        settings['sleep_time'] = float(sleep_time) if sleep_time else None
+        settings['suppression_time'] = float(watch_file.get('suppression_time', SUPPRESSION_TIME))
+    except (TypeError, ValueError) as e:
+        raise HandledException('%s has an invalid time: %s' % (watch_file_path, e))
+
+    settings['notifier_specs'] = parse_notifier_specs(watch_file.get('notifiers', DEFAULT_NOTIFIERS),
+                                                      watch_file_path)
+
+    watches = []
+    keys = set()
+    for index, watch_spec in enumerate(watch_file['watches']):
+        try:
+            watch = parse_watch(watch_spec)
+        except (HandledException, KeyError, TypeError, ValueError) as e:
+            raise HandledException('Watch #%s in %s is invalid: %s' % (index + 1, watch_file_path, e))
+
+        # Watches are matched across reloads by key, repeated keys are numbered in file order
+        key = watch.key
+        repeat = 1
+        while watch.key in keys:
+            repeat += 1
+            watch.key = '%s#%s' % (key, repeat)
+        keys.add(watch.key)
+        watches.append(watch)
+    return settings, watches
+
+
+def apply_watch_file_settings(hunter, settings):
+    # Pages and sales differ between servers, so nothing cached for the old server is kept
+    if str(settings['sid']) != str(hunter.cookies['sid']):
+        hunter.page_cache.clear()
+        hunter.sales_history.clear()
+    hunter.cookies = {'sid': settings['sid']}
+    if hunter.session is not None:
+        hunter.session.cookies.set('sid', str(settings['sid']))
+
+    if settings['sleep_time'] is not None:
+        hunter.sleep_time = settings['sleep_time']
+    hunter.notifier_specs = settings['notifier_specs']
+    hunter.suppression_time = settings['suppression_time']
+
+
+def reload_watch_file(hunter, watch_file_path, watches):
+    # A new notifier needs its files before it is used, there is no one to answer a prompt
+    try:
+        settings, new_watches = load_watch_file(watch_file_path)
+        check_notifier_files(settings['notifier_specs'])
+    except HandledException as e:
+        print_and_log('Keeping the current watches, %s' % e, Colors.RED)
+        return []
+    apply_watch_file_settings(hunter, settings)
+
+    current_watches = {watch.key: watch for watch in watches}
+    new_keys = {watch.key for watch in new_watches}
+
+    # Removed watches are finished so the scheduler drops them
+    removed_watches = [watch for watch in watches if watch.key not in new_keys]
+    for key in list(hunter.finished_watches):
+        if key not in new_keys:
+            del hunter.finished_watches[key]
+    for watch in removed_watches:
+        watch.is_finished = True
+        watches.remove(watch)
+
+    # Changed watches keep their state but take the new settings and url, they are only rescheduled when
+    # their page or interval changed
+    added_watches = []
+    rescheduled_watches = []
+    modified_count = 0
+    for new_watch in new_watches:
+        watch = current_watches.get(new_watch.key)
+        if watch is None:
+            # Finished watches only start again once their own entry changes
+            if hunter.finished_watches.get(new_watch.key) == get_watch_signature(new_watch):
+                continue
+            hunter.finished_watches.pop(new_watch.key, None)
+            watches.append(new_watch)
+            added_watches.append(new_watch)
+            continue
+
+        is_same_page = get_page_key(watch.ah_url) == get_page_key(new_watch.ah_url)
+        if not is_same_page or get_watch_settings(watch.config) != get_watch_settings(new_watch.config):
+            # The sale a player watch has reached only means something on the same page
+            is_same_hunt = is_same_page and new_watch.config['hunt_mode'] == watch.config['hunt_mode']
+            if is_same_hunt and 'last_saleon' in watch.config:
+                new_watch.config['last_saleon'] = watch.config['last_saleon']
+            interval = get_watch_interval(hunter, watch.config, watch.ah_url)
+            watch.ah_url = new_watch.ah_url
+            watch.config = new_watch.config
+            modified_count += 1
+
+            if not is_same_page or get_watch_interval(hunter, watch.config, watch.ah_url) != interval:
+                watch.next_check_time = get_next_check_time(hunter, watch.config, watch.ah_url)
+                rescheduled_watches.append(watch)
+
+    print_and_log('Reloaded %s: %s added, %s removed, %s modified' % (
+        watch_file_path, len(added_watches), len(removed_watches), modified_count), Colors.GREEN)
+    return added_watches + rescheduled_watches
+
+
+def get_watch_settings(config):
+    # The config without the state a watch picks up while running
+    return {key: value for key, value in config.items() if key != 'last_saleon'}
+
+
+def get_watch_signature(watch):
+    return get_page_key(watch.ah_url), get_watch_settings(watch.config)
+
+
+def get_watch_file_stat(watch_file_path):
+    try:
+        stat = os.stat(watch_file_path)
+    except OSError:
+        return None
+    return (stat.st_mtime_ns, stat.st_size)
+
+
+def read_watch_file(watch_file_path):
+    try:
+        with open(watch_file_path, 'rb') as f:
+            contents = f.read()
+    except IOError as e:
+        raise HandledException('Could not read %s: \n%s' % (watch_file_path, e))
+
+    try:
+        if watch_file_path.lower().endswith('.toml'):
+            if tomllib is None:
+                raise HandledException('Reading TOML watch files requires python 3.11, use JSON instead')
+            return tomllib.loads(contents.decode('utf-8'))
+        return json.loads(contents.decode('utf-8'))
+    except ValueError as e:
+        raise HandledException('Could not parse %s: \n%s' % (watch_file_path, e))
+
+
+def parse_watch(watch_spec):
+    ah_url = parse_ahurl(watch_spec['url'].strip().lower())
+
+    # Player urls can only be hunted in player mode
+    mode = watch_spec.get('mode') or ('player' if ah_url.url_type.lower() == 'player' else None)
+    if mode not in {Modes.INVENTORY.value, Modes.PRICE.value, Modes.PLAYER.value}:
+        raise HandledException('mode must be inventory, price, or player')
+
+    if mode == Modes.INVENTORY.value:
+        condition = watch_spec.get('condition', 'stocked')
+        if condition not in {'empty', 'stocked', 'range'}:
+            raise HandledException('condition must be empty, stocked, or range')
+        config = {
+            'hunt_mode': Modes.INVENTORY,
+            'is_count_down': condition == 'empty',
+            'is_range': condition == 'range',
+            'lower_bound': int(watch_spec.get('lower_bound', 0)),
+            'upper_bound': int(watch_spec.get('upper_bound', 0)),
+        }
+
+    elif mode == Modes.PRICE.value:
+        condition = watch_spec.get('condition')
+        if condition not in {'above', 'below'}:
+            raise HandledException('condition must be above or below')
+        config = {
+            'hunt_mode': Modes.PRICE,
+            'target_price': int(watch_spec['target_price']),
+            'is_greater': condition == 'above',
+        }
+
+    else:
+        config = {
+            'hunt_mode': Modes.PLAYER,
+            'specific_item_name': watch_spec.get('specific_item'),
+        }
+
+    # Optional scheduling settings, intervals are in seconds
+    for key in ('interval', 'min_interval', 'max_interval'):
+        if watch_spec.get(key) is not None:
+            config[key] = float(watch_spec[key])
+    config['is_adaptive'] = bool(watch_spec.get('adaptive', False))
+
+    key = watch_spec.get('id') or '%s %s' % (get_page_key(ah_url), mode)
+    return Watch(key=key, ah_url=ah_url, config=config)
+
+
 #######################################################################################################################
 #                                                      User Input                                                     #
 #######################################################################################################################
@@ -523,33 +1742,38 @@ def get_option_user_input(options, message):
 
 
 def get_ahurl():
-    tail = ''
-    while not tail:
+    ah_url = None
+    while ah_url is None:
         url = get_string_user_input('Paste the %s for the item and press enter.' % greenify('ffixah url'))
         try:
-            # Parse the item_name out of the url, accounting for stack pages
-            # Ex: https://www.ffxiah.com/item_name/4752/fire-crystal
-            #     https://www.ffxiah.com/item_name/4096/fire-crystal/?stack=1
-            stack_split_list = url.rsplit('/?stack=1', 1)
-            base_url = stack_split_list[0]
-            query_params = {}
-            if len(stack_split_list) == 2:
-                query_params['stack'] = 1
-
-            segments = base_url.rsplit('/', 3)
-            if len(segments) < 4:
-                raise ValueError('Must supply an entire ffxiah url')
-
-            url_type = segments[1]
-            tail = segments[3].lower()
-
-            # The url was for a stack so add the suffix
-            if query_params:
-                tail += '-stack'
-
+            ah_url = parse_ahurl(url)
         except ValueError as e:
             print_and_log(e, Colors.YELLOW)
 
+    return ah_url
+
+
+def parse_ahurl(url):
+    # Parse the item_name out of the url, accounting for stack pages
+    # Ex: https://www.ffxiah.com/item_name/4752/fire-crystal
+    #     https://www.ffxiah.com/item_name/4096/fire-crystal/?stack=1
+    stack_split_list = url.rsplit('/?stack=1', 1)
+    base_url = stack_split_list[0]
+    query_params = {}
+    if len(stack_split_list) == 2:
+        query_params['stack'] = 1
+
+    segments = base_url.rsplit('/', 3)
+    if len(segments) < 4 or not segments[3]:
+        raise ValueError('Must supply an entire ffxiah url')
+
+    url_type = segments[1]
+    tail = segments[3].lower()
+
+    # The url was for a stack so add the suffix
+    if query_params:
+        tail += '-stack'
+
     return AHUrl(url=url, base=base_url, params=query_params, url_type=url_type, tail=tail)
 
 
@@ -577,28 +1801,33 @@ def get_restart_options():
     return restart_options
 
 
-def get_retry_options():
-    print_and_log('\nWould you like to resume the script and keep trying?', Colors.YELLOW)
-    retry_options = {'should_retry': get_boolean_input()}
-    return retry_options
-
-
 def get_send_grid_key():
+    # Read from disk once per process
+    if 'send_grid_key' in global_credentials:
+        return global_credentials['send_grid_key']
+
     file_path = 'data/send_grid_key.txt'
     send_grid_key = get_file_data(file_path)
     if send_grid_key is None:
         send_grid_key = get_string_user_input('Paste your %s and press enter.' % (greenify('Send Grid API key')),
                                               lower=False)
         store_data(file_path, send_grid_key)
+    global_credentials['send_grid_key'] = send_grid_key
     return send_grid_key
 
 
 def get_email_notification_address():
+    # Read from disk once per process
+    if 'notification_address' in global_credentials:
+        return global_credentials['notification_address']
+
     file_path = 'data/notification_address.txt'
     notification_address = get_file_data(file_path)
     if notification_address is None:
-        notification_address = get_string_user_input('Type the email address to notify and press enter')
+        notification_address = get_string_user_input('Type the email address to notify and press enter '
+                                                      '(separate several addresses with commas)')
         store_data(file_path, notification_address)
+    global_credentials['notification_address'] = notification_address
     return notification_address
 
 
@@ -625,7 +1854,7 @@ def get_hunt_mode(url_type):
         return Modes[hunt_mode.upper()]
 
 
-def set_global_sleep_time(config=None):
+def set_sleep_time(hunter, config=None):
     if config and config['hunt_mode'] in {Modes.PRICE, Modes.PLAYER}:
         sleep_time = 15
     else:
@@ -641,8 +1870,7 @@ def set_global_sleep_time(config=None):
                     print_and_log('Must supply an integer greater than 0.', Colors.YELLOW)
             store_data(file_path, str(sleep_time))
 
-    global global_sleep_time
-    global_sleep_time = int(sleep_time)
+    hunter.sleep_time = float(sleep_time)
 
 
 #######################################################################################################################
@@ -674,36 +1902,309 @@ def print_and_log(message, color=None, indent=False):
     sys.stdout.flush()
 
 
-def send_email(ah_url, message):
-    notification_address = get_email_notification_address()
-    mail = Mail(
-        from_email='auction_hunter <notifications@auction_hunter>',
-        to_emails=notification_address,
-        subject='%s notification' % ah_url.tail,
-        html_content='<h2>auction_hunter is notifying you: <br/> <a href="%s">%s</a>.</h2>' % (ah_url.url, message))
+def send_email(hunter, ah_url, message, condition=None, observed_value=None):
+    # Repeats are dropped before they cost an api call, like a restart finding the same stock again,
+    # returns False when the notification was dropped
+    if condition is not None and is_notification_suppressed(ah_url, condition, observed_value,
+                                                            hunter.suppression_time):
+        print_and_log('Already notified within the last %d seconds, not notifying again' % hunter.suppression_time,
+                      Colors.YELLOW, indent=True)
+        return False
+
+    # Queue the notification in the outbox once per notifier, the dispatcher sends them in the background
+    created_at = time.time()
+    for notifier_spec in hunter.notifier_specs:
+        notifier = get_notifier(notifier_spec)
+        address = notifier.get_address()
+        key = hashlib.sha256(('%s|%s|%s|%s|%s' % (notifier.name, address, ah_url.url, message, created_at)).encode())
+        enqueue_notification({
+            'key': key.hexdigest(),
+            'notifier': notifier.name,
+            'notifier_key': get_notifier_key(notifier_spec),
+            'address': address,
+            'subject': '%s notification' % ah_url.tail,
+            'url': ah_url.url,
+            'message': message,
+            'created_at': created_at,
+        })
+    return True
+
+
+def is_notification_suppressed(ah_url, condition, observed_value, suppression_time):
+    # Keyed on the page rather than the watch so several watches on one item share a window,
+    # each entry holds when its window ends so hunters with different windows can share the file
+    suppression_key = '%s|%s|%s' % (get_page_key(ah_url), condition, observed_value)
+    with global_notification_lock:
+        suppressions = get_suppressions()
+        now = time.time()
+        if now < suppressions.get(suppression_key, 0):
+            return True
+
+        suppressions[suppression_key] = now + suppression_time
+        store_suppressions(suppressions, now)
+        return False
+
+
+def get_suppressions():
+    global global_suppressions
+    if global_suppressions is None:
+        try:
+            with open(get_combined_path(SUPPRESSIONS_PATH), 'r') as f:
+                global_suppressions = json.load(f)
+        except (IOError, ValueError):
+            global_suppressions = {}
+    return global_suppressions
+
+
+def store_suppressions(suppressions, now):
+    # Expired entries are dropped and the file is replaced whole so a crash never leaves it half written
+    for suppression_key, suppressed_until in list(suppressions.items()):
+        if suppressed_until <= now:
+            del suppressions[suppression_key]
+
+    path = get_combined_path(SUPPRESSIONS_PATH)
+    temp_path = '%s.tmp' % path
+    with open(temp_path, 'w') as f:
+        json.dump(suppressions, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+
+def enqueue_notification(notification):
+    start_notification_dispatcher()
+    with global_notification_lock:
+        append_to_outbox(dict(notification, event='queued'))
+        next_attempt_at = notification['created_at'] + NOTIFICATION_DIGEST_TIME
+        global_outbox[notification['key']] = dict(notification, attempt=0, next_attempt_at=next_attempt_at)
+    global_outbox_timer.wake()
+
+
+def start_notification_dispatcher():
+    global global_outbox_thread
+    with global_notification_lock:
+        if global_outbox_thread is not None:
+            return
+
+        for notification in load_outbox(get_combined_path(OUTBOX_PATH)):
+            global_outbox[notification['key']] = dict(notification, attempt=0, next_attempt_at=0)
+        if global_outbox:
+            log('Resending %s undelivered notifications' % len(global_outbox))
+
+        global_outbox_thread = threading.Thread(target=dispatch_notifications, name='notifications', daemon=True)
+        global_outbox_thread.start()
+        atexit.register(drain_outbox)
+
+
+def load_outbox(path):
+    # Replays the outbox and compacts it down to the notifications that were never sent
+    pending = {}
+    try:
+        with open(path, 'r') as f:
+            for line in f:
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    # A crash can leave the last line half written
+                    continue
+                if record.get('event') == 'queued':
+                    pending[record['key']] = record
+                elif record.get('event') == 'sent':
+                    pending.pop(record['key'], None)
+    except IOError:
+        return []
 
-    api_key = get_send_grid_key()
+    temp_path = '%s.tmp' % path
+    with open(temp_path, 'w') as f:
+        for record in pending.values():
+            f.write('%s\n' % json.dumps(record))
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(temp_path, path)
+
+    return [{name: value for name, value in record.items() if name != 'event'} for record in pending.values()]
+
+
+def append_to_outbox(record):
+    # Synced to disk before returning so a notification survives a crash right after it was queued
+    with open(get_combined_path(OUTBOX_PATH), 'a') as f:
+        f.write('%s\n' % json.dumps(record))
+        f.flush()
+        os.fsync(f.fileno())
+
+
+def dispatch_notifications():
+    while True:
+        for notifications in get_due_digests():
+            if deliver_notifications(notifications):
+                with global_notification_lock:
+                    for notification in notifications:
+                        append_to_outbox({'event': 'sent', 'key': notification['key'], 'sent_at': time.time()})
+                        del global_outbox[notification['key']]
+            else:
+                attempt = max(notification['attempt'] for notification in notifications) + 1
+                next_attempt_at = time.time() + get_backoff_time(attempt)
+                for notification in notifications:
+                    notification['attempt'] = attempt
+                    notification['next_attempt_at'] = next_attempt_at
+                log('Retrying %s notifications in %.0f seconds' % (len(notifications), next_attempt_at - time.time()))
+
+        with global_notification_lock:
+            next_attempt_at = min([notification['next_attempt_at'] for notification in global_outbox.values()],
+                                  default=time.time() + OUTBOX_POLL_TIME)
+        global_outbox_timer.wait(min(OUTBOX_POLL_TIME, next_attempt_at - time.time()))
+
+
+def get_due_digests():
+    # Once one notification for a recipient is due, everything queued for them goes out in the same batch
+    with global_notification_lock:
+        now = time.time()
+        digests = {}
+        for notification in global_outbox.values():
+            notifier_key = notification.get('notifier_key') or notification.get('notifier', 'sendgrid')
+            digests.setdefault((notifier_key, notification['address']), []).append(notification)
+
+    return [sorted(notifications, key=lambda notification: notification['created_at'])
+            for notifications in digests.values()
+            if any(notification['next_attempt_at'] <= now for notification in notifications)]
+
+
+def drain_outbox(drain_time=OUTBOX_DRAIN_TIME):
+    # Give queued notifications a chance to go out before exiting, anything left is resent by the next run
+    deadline = time.time() + drain_time
+    with global_notification_lock:
+        for notification in global_outbox.values():
+            if notification['attempt'] == 0:
+                notification['next_attempt_at'] = 0
+    global_outbox_timer.wake()
+
+    while time.time() < deadline:
+        with global_notification_lock:
+            if not any(notification['next_attempt_at'] < deadline for notification in global_outbox.values()):
+                break
+        time.sleep(0.1)
+
+    if global_outbox:
+        log('%s notifications left in the outbox' % len(global_outbox))
+
+
+def deliver_notifications(notifications):
+    notification_address = notifications[0]['address']
+    notifier = None
     try:
-        sg = SendGridAPIClient(api_key=api_key)
-        response = sg.send(mail)
-        log(response.status_code)
-        log(response.body)
-        log(response.headers)
+        notifier = find_notifier(notifications[0])
+        notifier.send(notifications)
     except Exception as e:
+        # Start over with a fresh connection on the next attempt
+        if notifier is not None:
+            notifier.close()
         print_and_log('\n%s %s' % (redify('Failed to notify'), notification_address))
         print_and_log(e)
-    else:
-        print_and_log('\n%s %s' % (greenify('Successfully notified'), notification_address))
+        return False
+
+    print_and_log('\n%s %s' % (greenify('Successfully notified'), notification_address))
+    return True
+
+
+def get_digest(notifications):
+    # A single notification keeps its own key and subject, several are merged into one digest
+    if len(notifications) == 1:
+        notification = notifications[0]
+        html_content = '<h2>auction_hunter is notifying you: <br/> <a href="%s">%s</a>.</h2>' % (
+            notification['url'], notification['message'])
+        return notification['key'], notification['subject'], html_content
+
+    key = hashlib.sha256('|'.join(notification['key'] for notification in notifications).encode()).hexdigest()
+    subject = 'auction_hunter digest: %s notifications' % len(notifications)
+    html_content = '<h2>auction_hunter is notifying you:</h2><ul>%s</ul>' % ''.join(
+        '<li><a href="%s">%s</a>.</li>' % (notification['url'], notification['message'])
+        for notification in notifications)
+    return key, subject, html_content
+
+
+def get_notification_payload(notification):
+    return {name: notification[name] for name in ('key', 'subject', 'url', 'message', 'created_at')}
+
+
+def get_notification_recipients(notification_address):
+    return [address.strip() for address in notification_address.split(',') if address.strip()]
+
+
+def get_notifier(notifier_spec):
+    # Hunters with the same notifier settings share one notifier and so its open connection
+    notifier_key = get_notifier_key(notifier_spec)
+    with global_notification_lock:
+        notifier = global_notifiers.get(notifier_key)
+        if notifier is None:
+            notifier = parse_notifier(notifier_spec)
+            global_notifiers[notifier_key] = notifier
+    return notifier
+
+
+def get_notifier_key(notifier_spec):
+    # The outbox stores this hash rather than the settings, which can hold passwords and tokens
+    return hashlib.sha256(json.dumps(notifier_spec, sort_keys=True).encode()).hexdigest()
+
+
+def find_notifier(notification):
+    # Settings edited since the notification was queued are found by the notifier's name, notifications
+    # queued before notifiers could be configured went to SendGrid
+    notifier_name = notification.get('notifier', 'sendgrid')
+    with global_notification_lock:
+        notifier = global_notifiers.get(notification.get('notifier_key'))
+        if notifier is None:
+            notifier = next((notifier for notifier in reversed(list(global_notifiers.values()))
+                             if notifier.name == notifier_name), None)
+    if notifier is not None:
+        return notifier
+
+    if notifier_name not in NOTIFIER_TYPES:
+        raise HandledException('There is no notifier named %s' % notifier_name)
+    return get_notifier({'type': notifier_name})
+
+
+def parse_notifier_specs(notifier_specs, watch_file_path):
+    if not isinstance(notifier_specs, list) or not notifier_specs:
+        raise HandledException('%s must contain a list of notifiers' % watch_file_path)
+
+    notifier_names = set()
+    for notifier_spec in notifier_specs:
+        notifier = parse_notifier(notifier_spec)
+        if notifier.name in notifier_names:
+            raise HandledException('There is more than one notifier named %s' % notifier.name)
+        notifier_names.add(notifier.name)
+    return notifier_specs
+
+
+def parse_notifier(notifier_spec):
+    if not isinstance(notifier_spec, dict) or notifier_spec.get('type') not in NOTIFIER_TYPES:
+        raise HandledException('Notifiers need a type of %s' % ', '.join(NOTIFIER_TYPES))
+
+    settings = {name: value for name, value in notifier_spec.items() if name != 'type'}
+    settings.setdefault('name', notifier_spec['type'])
+    return NOTIFIER_TYPES[notifier_spec['type']](**settings)
+
+
+def create_notification_session(headers):
+    # One keep-alive connection for the life of the notifier instead of a new one per batch
+    adapter = requests.adapters.HTTPAdapter(pool_connections=1, pool_maxsize=1)
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(headers)
+    return session
 
 
 #######################################################################################################################
 #                                                   Text Utilities                                                    #
 #######################################################################################################################
 def greenify(message):
+    import crayons
     return crayons.green(message, bold=True)
 
 
 def redify(message):
+    import crayons
     return crayons.red(message, bold=True)
 
 
@@ -749,6 +2250,7 @@ def format_message(message, color, indent):
     if color == Colors.RED:
         message = redify(message)
     elif color == Colors.YELLOW:
+        import crayons
         message = crayons.yellow(message)
     elif color == Colors.GREEN:
         message = greenify(message)
@@ -764,21 +2266,410 @@ def get_is_or_are(number):
 #######################################################################################################################
 #                                                    Misc Utilities                                                   #
 #######################################################################################################################
-def fetch_page_and_soupify(ah_url):
+def fetch_page(hunter, ah_url, data_names=(), stream=STREAM_FETCHES):
+    page_key = get_page_key(ah_url)
+    cached_page = hunter.page_cache.get(page_key)
+
+    # Only ask for a 304 when the data we need was extracted from the cached page
+    headers = {}
+    if cached_page and data_names and all(name in cached_page['extracted'] for name in data_names):
+        if cached_page['etag']:
+            headers['If-None-Match'] = cached_page['etag']
+        if cached_page['last_modified']:
+            headers['If-Modified-Since'] = cached_page['last_modified']
+
+    # Requests to a failing host are held back by its circuit
+    host = get_host(ah_url.base)
+    check_circuit(host)
+
+    # Every request waits for a token from its host's bucket
+    acquire_rate_limit(host)
+
+    start_time = time.time()
     try:
-        response = requests.get(ah_url.base, headers=HEADERS, cookies=global_cookies, params=ah_url.params)
-    except requests.ConnectionError as e:
+        with get_session(hunter).get(ah_url.base, params=ah_url.params, headers=headers,
+                               timeout=FETCH_TIMEOUT, stream=True) as response:
+            record_connection(hunter, response)
+
+            # Server errors and throttling count against the host's circuit
+            if response.status_code >= 500 or response.status_code == 429:
+                record_circuit_failure(host)
+                raise HandledException('FFXIAH responded with status %s' % response.status_code)
+            record_circuit_success(host)
+
+            # Not modified, reuse what was extracted last time without parsing
+            if response.status_code == 304:
+                if not headers:
+                    raise HandledException('FFXIAH responded not modified to an unconditional request')
+                log('%s was not modified' % ah_url.tail)
+                return Page(extracted=cached_page['extracted'], is_unchanged=True)
+
+            # Stop reading as soon as the data we need has arrived
+            if stream and data_names:
+                content, text, extracted, is_truncated = stream_page(response, data_names)
+            else:
+                content, text, extracted, is_truncated = response.content, response.text, {}, False
+
+            bytes_read = response.raw.tell()
+            content_length = response.headers.get('Content-Length')
+            etag = response.headers.get('ETag')
+            last_modified = response.headers.get('Last-Modified')
+    except requests.RequestException as e:
+        record_circuit_failure(host)
         raise HandledException('An exception was encountered requesting FFXIAH: \n%s' % e)
 
-    return BeautifulSoup(response.text, 'lxml')
+    elapsed = time.time() - start_time
+    page = Page(text=text, is_truncated=is_truncated)
+
+    # Estimate what stopping early saved from the rate the page was read at
+    if page.is_truncated and content_length and content_length.isdigit() and bytes_read:
+        page.bytes_saved = max(0, int(content_length) - bytes_read)
+        page.seconds_saved = elapsed * page.bytes_saved / bytes_read
+        log('%s stopped reading after %s of %s bytes' % (ah_url.tail, bytes_read, content_length))
+
+    # The same body was served again, reuse what was extracted last time
+    body_hash = hashlib.sha1(content).hexdigest()
+    if cached_page and cached_page['body_hash'] == body_hash:
+        log('%s was unchanged' % ah_url.tail)
+        cached_page['etag'] = etag
+        cached_page['last_modified'] = last_modified
+        page.extracted = cached_page['extracted']
+        page.is_unchanged = True
+
+    else:
+        hunter.page_cache[page_key] = {
+            'etag': etag,
+            'last_modified': last_modified,
+            'body_hash': body_hash,
+            'extracted': page.extracted,
+        }
+
+    page.extracted.update(extracted)
+    return page
+
+
+def stream_page(response, data_names):
+    decoder = codecs.getincrementaldecoder(response.encoding or 'utf-8')(errors='replace')
+    chunks = []
+    text = ''
+    extracted = {}
+
+    # Feed each chunk to the targeted extractors until every fragment is complete
+    for chunk in response.iter_content(chunk_size=STREAM_CHUNK_SIZE):
+        chunks.append(chunk)
+        text += decoder.decode(chunk)
+        for data_name in data_names:
+            if data_name not in extracted:
+                data = extract_data(text, data_name)
+                if data is not None:
+                    extracted[data_name] = data
+
+        if len(extracted) == len(data_names):
+            remaining_bytes = get_remaining_bytes(response)
+            if remaining_bytes is not None and remaining_bytes >= STREAM_MIN_SAVED_BYTES:
+                return b''.join(chunks), text, extracted, True
+
+    text += decoder.decode(b'', final=True)
+    return b''.join(chunks), text, extracted, False
+
+
+def get_remaining_bytes(response):
+    # None when the server did not say how long the body is
+    content_length = response.headers.get('Content-Length')
+    if not content_length or not content_length.isdigit():
+        return None
+    return int(content_length) - response.raw.tell()
+
+
+def get_page_key(ah_url):
+    return '%s?%s' % (ah_url.base, '&'.join('%s=%s' % item for item in sorted(ah_url.params.items())))
+
 
+def extract_page_data(hunter, page, data_name):
+    # Data is extracted at most once per distinct page body
+    if data_name not in page.extracted:
+        if page.text is None:
+            raise HandledException('%s was not cached for an unmodified page' % data_name)
 
-def sleep(sleep_time):
-    plural = ''
-    if sleep_time > 1:
-        plural = 's'
-    print_and_log('Sleeping for %s minute%s \n' % (sleep_time, plural), indent=True)
-    time.sleep(sleep_time * 60)
+        if page.is_truncated:
+            raise HandledException('%s was not read before the page was closed' % data_name)
+
+        # Try the targeted extractors first, only the stock count can still be read from the rendered page
+        data = extract_data(page.text, data_name)
+
+        if data is None and data_name == 'stock':
+            log('Falling back to soup for %s' % data_name)
+            soup = soupify(page.text)
+            data = parse_integer_from_soup(soup.findAll('span', {'class': 'stock'}), 'current stock')
+
+        # Transactions only exist as the script literal, parsing the same script through a soup would not find more
+        if data is None:
+            raise HandledException('%s were not found' % data_name)
+
+        page.extracted[data_name] = data
+
+    data = page.extracted[data_name]
+    if data_name != 'stock' and len(data) < 1:
+        raise HandledException('Sales data contains less than 1 entry')
+    return data
+
+
+def extract_data(text, data_name):
+    if data_name == 'stock':
+        return extract_stock(text)
+    return find_transactions(text, data_name)
+
+
+def extract_stock(text):
+    match = STOCK_PATTERN.search(text)
+    if not match:
+        return None
+
+    try:
+        return int(match.group(1))
+    except ValueError:
+        return None
+
+
+def find_transactions(text, script_index):
+    # Decode the array literal assigned to script_index, None when there is no complete literal
+    for match in TRANSACTIONS_PATTERN.finditer(text):
+        if match.group(1) != script_index:
+            continue
+
+        try:
+            transactions, _ = JSON_DECODER.raw_decode(text, match.end())
+        except ValueError:
+            continue
+
+        if isinstance(transactions, list):
+            return transactions
+    return None
+
+
+def get_session(hunter):
+    # A single keep-alive session is shared by every fetch so connections are reused across polls
+    with hunter.session_lock:
+        if hunter.session is None:
+            hunter.session = create_session(hunter.cookies)
+    return hunter.session
+
+
+def create_session(cookies, pool_connections=POOL_CONNECTIONS, pool_maxsize=POOL_MAXSIZE):
+    # No retries here, every request has to pass the rate limit and circuit so failures are retried by the backoff
+    adapter = requests.adapters.HTTPAdapter(pool_connections=pool_connections,
+                                            pool_maxsize=pool_maxsize,
+                                            max_retries=0)
+
+    session = requests.Session()
+    session.mount('https://', adapter)
+    session.mount('http://', adapter)
+    session.headers.update(HEADERS)
+    session.headers['Connection'] = 'keep-alive'
+    session.cookies.update({name: str(value) for name, value in cookies.items()})
+    return session
+
+
+def get_fetch_stats(hunter):
+    requests_sent = 0
+
+    # Each connection pool counts the requests it sent, handshakes are counted by fetch_page
+    if hunter.session is not None:
+        for adapter in set(hunter.session.adapters.values()):
+            pools = adapter.poolmanager.pools
+            for key in pools.keys():
+                pool = pools.get(key)
+                if pool is not None:
+                    requests_sent += pool.num_requests
+    handshakes = hunter.fetch_counts['handshakes']
+
+    reuse_ratio = 0
+    if requests_sent:
+        reuse_ratio = max(0, requests_sent - handshakes) / requests_sent
+
+    return {
+        'requests': requests_sent,
+        'handshakes': handshakes,
+        'reuse_ratio': round(reuse_ratio, 3),
+        'shared_fetches': hunter.fetch_counts['fetches'],
+        'coalesced_checks': hunter.fetch_counts['coalesced'],
+        'rate_limits': get_rate_limit_stats(),
+    }
+
+
+def record_connection(hunter, response):
+    # A socket not seen before is a new connection, pools reconnect dropped connections without counting them
+    connection = getattr(response.raw, 'connection', None)
+    sock = getattr(connection, 'sock', None)
+    with hunter.session_lock:
+        if sock is not None and sock not in hunter.sockets:
+            hunter.sockets.add(sock)
+            hunter.fetch_counts['handshakes'] += 1
+
+
+def get_host(url):
+    return urllib.parse.urlsplit(url).netloc.lower()
+
+
+def acquire_rate_limit(host):
+    limit = RATE_LIMITS.get(host, DEFAULT_RATE_LIMIT)
+
+    with global_rate_limit_lock:
+        bucket = global_rate_limits.get(host)
+        if bucket is None:
+            bucket = {'tokens': limit['burst'], 'updated_at': time.monotonic(),
+                      'requests': 0, 'total_wait': 0, 'max_wait': 0}
+            global_rate_limits[host] = bucket
+
+        # Refill for the time that has passed, then reserve a token even if that leaves the bucket in debt
+        now = time.monotonic()
+        bucket['tokens'] = min(limit['burst'], bucket['tokens'] + (now - bucket['updated_at']) * limit['rate'])
+        bucket['updated_at'] = now
+        bucket['tokens'] -= 1
+
+        # Requests queue in the order they reserved, each waits until its token has been refilled
+        wait = max(0, -bucket['tokens'] / limit['rate'])
+        bucket['requests'] += 1
+        bucket['total_wait'] += wait
+        bucket['max_wait'] = max(bucket['max_wait'], wait)
+
+    if wait:
+        log('Waiting %.2f seconds for a %s request token' % (wait, host))
+        time.sleep(wait)
+    return wait
+
+
+def get_backoff_time(consecutive_failures):
+    # Capped exponential backoff, half fixed and half random so retries spread out
+    backoff_time = min(BACKOFF_MAX_TIME, BACKOFF_BASE_TIME * 2 ** (consecutive_failures - 1))
+    return backoff_time / 2 + random.uniform(0, backoff_time / 2)
+
+
+def check_circuit(host):
+    with global_circuit_lock:
+        circuit = global_circuits.get(host)
+        if circuit is None or circuit['state'] == 'closed':
+            return
+
+        now = time.time()
+        if circuit['state'] == 'open':
+            if now < circuit['retry_at']:
+                raise CircuitOpenException('%s is failing, pausing requests for %d seconds' % (
+                    host, circuit['retry_at'] - now), circuit['retry_at'])
+
+            # The circuit has been open long enough, let this request through as the single probe
+            circuit['state'] = 'probing'
+            log('Probing %s' % host)
+            return
+
+        # A probe is already in flight, wait for its outcome
+        raise CircuitOpenException('%s is being probed' % host, now + CIRCUIT_PROBE_WAIT)
+
+
+def record_circuit_success(host):
+    with global_circuit_lock:
+        circuit = global_circuits.get(host)
+        if circuit is None:
+            return
+
+        if circuit['state'] != 'closed':
+            print_and_log('%s has recovered, resuming requests' % host, Colors.GREEN)
+        del global_circuits[host]
+
+
+def record_circuit_failure(host):
+    with global_circuit_lock:
+        circuit = global_circuits.setdefault(host, {'state': 'closed', 'failures': 0, 'open_time': 0})
+        circuit['failures'] += 1
+
+        # A failed probe keeps the circuit open for twice as long
+        if circuit['state'] == 'probing':
+            circuit['open_time'] = min(CIRCUIT_MAX_OPEN_TIME, circuit['open_time'] * 2)
+        elif circuit['state'] == 'closed' and circuit['failures'] >= MAX_RETRIES:
+            circuit['open_time'] = CIRCUIT_OPEN_TIME
+        else:
+            return
+
+        circuit['state'] = 'open'
+        circuit['retry_at'] = time.time() + circuit['open_time']
+        print_and_log('%s failed %s consecutive times, pausing requests for %d seconds' % (
+            host, circuit['failures'], circuit['open_time']), Colors.RED)
+
+
+def get_rate_limit_stats():
+    with global_rate_limit_lock:
+        return {host: {
+            'requests': bucket['requests'],
+            'average_wait': round(bucket['total_wait'] / bucket['requests'], 3),
+            'max_wait': round(bucket['max_wait'], 3),
+        } for host, bucket in global_rate_limits.items()}
+
+
+async def fetch_page_async(hunter, ah_url, semaphore, data_names=()):
+    import asyncio
+    # The semaphore bounds how many requests are in flight at once, the blocking
+    # request itself runs on the event loop's executor so the loop stays free
+    async with semaphore:
+        loop = asyncio.get_running_loop()
+        return await loop.run_in_executor(None, fetch_page, hunter, ah_url, data_names)
+
+
+async def fetch_shared_page_async(hunter, ah_url, semaphore, data_names=()):
+    import asyncio
+    fetch_key = get_fetch_key(hunter, ah_url)
+    shared_fetch = hunter.shared_fetches.get(fetch_key)
+
+    # Join a fetch of the same page that is in flight or just finished when it covers our data
+    if shared_fetch and set(data_names) <= shared_fetch['data_names']:
+        hunter.fetch_counts['coalesced'] += 1
+        return await asyncio.shield(shared_fetch['task'])
+
+    hunter.fetch_counts['fetches'] += 1
+    task = asyncio.ensure_future(fetch_page_async(hunter, ah_url, semaphore, data_names))
+    hunter.shared_fetches[fetch_key] = {'task': task, 'data_names': set(data_names)}
+
+    # Forget the shared result once the coalescing window has passed
+    loop = asyncio.get_running_loop()
+    task.add_done_callback(lambda _: loop.call_later(COALESCE_SECONDS, forget_shared_fetch, hunter, fetch_key, task))
+    return await asyncio.shield(task)
+
+
+def forget_shared_fetch(hunter, fetch_key, task):
+    shared_fetch = hunter.shared_fetches.get(fetch_key)
+    if shared_fetch and shared_fetch['task'] is task:
+        del hunter.shared_fetches[fetch_key]
+
+
+def get_fetch_key(hunter, ah_url):
+    return (get_page_key(ah_url), str(hunter.cookies['sid']))
+
+
+def soupify(text):
+    # bs4 and lxml are only needed when the fast extraction path misses
+    from bs4 import BeautifulSoup
+    return BeautifulSoup(text, 'lxml')
+
+
+def set_fetch_executor(loop, max_concurrent_fetches):
+    import concurrent.futures
+    # Size the executor so that it never becomes the bottleneck for the semaphore
+    executor = concurrent.futures.ThreadPoolExecutor(max_workers=max_concurrent_fetches)
+    loop.set_default_executor(executor)
+    return executor
+
+
+def sleep(sleep_time, timer):
+    # Sleeps for sleep_time seconds, returns True if the timer was woken or cancelled first
+    sleep_time = max(0, sleep_time)
+    if sleep_time < 60:
+        print_and_log('Sleeping for %d seconds \n' % round(sleep_time), indent=True)
+    else:
+        minutes = round(sleep_time / 60, 1)
+        plural = ''
+        if minutes != 1:
+            plural = 's'
+        print_and_log('Sleeping for %g minute%s \n' % (minutes, plural), indent=True)
+    return timer.wait(sleep_time)
 
 
 def get_combined_path(path):
@@ -828,36 +2719,6 @@ def is_within_range(number_to_check, lower_bound, upper_bound):
     return number_to_check >= lower_bound and number_to_check <= upper_bound
 
 
-def parse_transactions(scripts, script_index):
-    if len(scripts) < 8:
-        raise HandledException('Script was not found on the page')
-
-    try:
-        item_script_tag = scripts[7].contents[0]
-    except Exception as e:
-        raise HandledException('Script contents were not found')
-
-    try:
-        transactions = item_script_tag.split('%s = ' % script_index)[1]
-    except Exception as e:
-        raise HandledException('%s were not found' % script_index)
-
-    try:
-        transactions = re.search("\[\{.*?\}\]", transactions).group()
-    except Exception as e:
-        raise HandledException('Regular expression matching failed')
-
-    try:
-        transactions = json.loads(transactions)
-    except Exception as e:
-        raise HandledException('Json failed to load')
-
-    if len(transactions) < 1:
-        raise HandledException('Sales data contains less than 1 entry')
-
-    return transactions
-
-
 def parse_integer_from_soup(soup, parse_name):
     if not len(soup):
         raise HandledException('%s was not found on the page' % parse_name.capitalize())
@@ -881,4 +2742,5 @@ def parse_integer_from_string(int_str, parse_name):
 
 
 # Run the script
-main()
+if __name__ == '__main__':
+    main()